@@ -5,13 +5,17 @@ Main application entry point
 """
 
 import os
+import asyncio
+import hashlib
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from brotli_asgi import BrotliMiddleware
 from typing import Optional, List
+from datetime import datetime
 
 from zillow_ai.agent import ApartmentFinderAgent
 from zillow_ai.models import SearchCriteria, SavedSearch
@@ -23,15 +27,48 @@ load_dotenv()
 # Initialize FastAPI app
 app = FastAPI(title="ZillowAI Apartment Finder")
 
+# Compress responses with brotli, falling back to gzip for older clients
+app.add_middleware(BrotliMiddleware, minimum_size=500)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Setup Jinja2 templates
 templates = Jinja2Templates(directory="templates")
 
+def _template_fingerprint() -> str:
+    """Hash the template contents so cached pages are invalidated by a change to them"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(os.listdir("templates")):
+        digest.update(name.encode("utf-8"))
+        with open(os.path.join("templates", name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+# Identical across hosts deployed from the same templates
+TEMPLATE_FINGERPRINT = _template_fingerprint()
+
 # Initialize agent
 agent = ApartmentFinderAgent()
 
+def _content_etag(*parts: str) -> str:
+    """Build a weak ETag from the content a page is rendered from"""
+    digest = hashlib.blake2b(TEMPLATE_FINGERPRINT.encode("utf-8"), digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+    # Weak because compression changes the bytes but not the page
+    return f'W/"{digest.hexdigest()}"'
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Check whether the client's If-None-Match already has this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Render the main page"""
@@ -150,12 +187,19 @@ async def property_details(request: Request, property_id: str):
     """View detailed information about a specific property"""
     try:
         details = await agent.get_property_details(property_id)
+        price_history = await asyncio.to_thread(agent.price_history.history, property_id)
+        etag = _content_etag(details.model_dump_json(), *(p.model_dump_json() for p in price_history))
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
         return templates.TemplateResponse(
             "details.html", 
             {
                 "request": request,
-                "property": details
-            }
+                "property": details,
+                "price_history": price_history
+            },
+            headers={"ETag": etag}
         )
     except Exception as e:
         return templates.TemplateResponse(
@@ -166,6 +210,12 @@ async def property_details(request: Request, property_id: str):
             }
         )
 
+@app.get("/api/price-drops")
+def price_drops(location: str, since: Optional[datetime] = None):
+    """API endpoint for price drops in a location ("City, ST" or zipcode) since a time"""
+    drops = agent.price_history.price_drops(location, since)
+    return {"location": location, "drops": drops}
+
 @app.get("/chat", response_class=HTMLResponse)
 async def chat_interface(request: Request):
     """Interactive chat interface with the apartment finder agent"""
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Memory and construction throughput benchmark: Property vs PropertyRecord
+
+Usage: python benchmarks/bench_property_record.py [count]
+"""
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zillow_ai.models import Property, PropertyRecord
+
+CITIES = [("New York", "NY", "10001"), ("Brooklyn", "NY", "11201"), ("Jersey City", "NJ", "07302")]
+
+def _sample_fields(i: int) -> dict:
+    """Build listing fields with the string churn a parsed API response has"""
+    city, state, zipcode = CITIES[i % len(CITIES)]
+    return {
+        "id": str(1000000 + i),
+        "address": f"{i} Main St",
+        "city": "".join(city),
+        "state": "".join(state),
+        "zipcode": "".join(zipcode),
+        "price": 1500 + i % 2000,
+        "bedrooms": 2,
+        "bathrooms": 1.5,
+        "square_feet": 900,
+        "description": "",
+        "url": f"https://www.zillow.com/homedetails/{1000000 + i}_zpid/",
+        "image_urls": [f"https://photos.zillowstatic.com/{i}.jpg"],
+        "latitude": 40.7,
+        "longitude": -74.0,
+        "property_type": "".join("APARTMENT"),
+    }
+
+def _throughput(label: str, factory, rows: list):
+    """Report construction throughput, timed without tracemalloc running"""
+    start = time.perf_counter()
+    for row in rows:
+        factory(row)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(rows) / elapsed:>12,.0f} objs/s")
+
+def _retained(label: str, factory, rows: list):
+    """Report memory retained per instance, in a separate pass"""
+    tracemalloc.start()
+    items = [factory(row) for row in rows]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {retained / len(rows):>12,.0f} B/obj")
+    del items
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = [_sample_fields(i) for i in range(count)]
+    factories = [
+        ("Property", lambda row: Property(**row)),
+        ("PropertyRecord", lambda row: PropertyRecord(**row)),
+        ("PropertyRecord.to_property", lambda row: PropertyRecord(**row).to_property()),
+    ]
+    
+    for label, factory in factories:
+        _throughput(label, factory, rows)
+    for label, factory in factories[:2]:
+        _retained(label, factory, rows)
+
+if __name__ == "__main__":
+    main()
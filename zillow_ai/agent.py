@@ -4,13 +4,19 @@ ApartmentFinderAgent - Core agent for searching apartments using Zillow API
 
 import os
 import json
+import time
+import asyncio
 import aiohttp
 import logging
-from typing import List, Dict, Any, Optional
+import orjson
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
-from tenacity import retry, stop_after_attempt, wait_exponential
 
-from .models import SearchCriteria, Property, Conversation
+from .models import SearchCriteria, Property, PropertyRecord, Conversation
+from .replay import archive_from_env, make_key
+from .history import PriceHistoryStore
+from .resilience import ResilientCaller, CircuitOpenError, NonRetryableError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,6 +25,16 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Number of upstream responses kept for serving stale data during outages
+STALE_CACHE_SIZE = 256
+
+# Listings kept for the details page, and how long their prices stay fresh
+PROPERTY_CACHE_SIZE = 100000
+PROPERTY_CACHE_TTL = 15 * 60
+
+# Responses at least this large are decoded in a worker thread, off the event loop
+LARGE_RESPONSE_BYTES = 64 * 1024
+
 class ApartmentFinderAgent:
     """Agent for finding apartments using Zillow API"""
     
@@ -33,15 +49,66 @@ class ApartmentFinderAgent:
             logger.warning("OPENAI_API_KEY not found in environment variables")
             
         self.conversation = Conversation()
-        self.last_search_results = []
+        self.property_cache: "OrderedDict[str, Tuple[float, PropertyRecord]]" = OrderedDict()
+        self.price_history = PriceHistoryStore()
         self.base_url = "https://zillow-com1.p.rapidapi.com"
         
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    async def _make_api_request(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Make a request to the Zillow API with retry logic"""
+        # Optional record/replay of upstream traffic (TRAFFIC_MODE=record|replay)
+        self.traffic_archive = archive_from_env()
+        
+        # Latency-aware resilience for upstream calls
+        self.upstream = ResilientCaller(
+            attempt_timeout=float(os.getenv("UPSTREAM_ATTEMPT_TIMEOUT", "5")),
+            max_attempts=int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+        )
+        self.upstream_deadline = float(os.getenv("UPSTREAM_DEADLINE", "10"))
+        self.serve_stale = os.getenv("SERVE_STALE_ON_FAILURE", "True").lower() in ("1", "true", "yes")
+        self._stale_responses: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        
+    async def _make_api_request(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Make a request to the Zillow API with hedging, retries and a circuit breaker
+        
+        deadline is a time.monotonic() value; it defaults to UPSTREAM_DEADLINE
+        seconds from now and may be shared by several requests.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.upstream_deadline
+        
+        archive_key = make_key("zillow", {"endpoint": endpoint, "params": params})
+        if self.traffic_archive and self.traffic_archive.mode == "replay":
+            return await self.traffic_archive.replay(archive_key)
+        
         if not self.api_key:
             raise ValueError("Zillow API key is not set. Please set the ZILLOW_API_KEY environment variable.")
         
+        try:
+            data = await self.upstream.call(endpoint, lambda: self._fetch(endpoint, params), deadline)
+        except NonRetryableError:
+            raise
+        except Exception as e:
+            # Fail fast, but prefer a stale answer over none while upstream is unhealthy
+            stale = self._stale_responses.get(archive_key)
+            if stale is None or not self.serve_stale:
+                raise
+            logger.warning(f"Serving stale {endpoint} response: {e}")
+            return stale
+        
+        self._stale_responses[archive_key] = data
+        self._stale_responses.move_to_end(archive_key)
+        if len(self._stale_responses) > STALE_CACHE_SIZE:
+            self._stale_responses.popitem(last=False)
+        
+        if self.traffic_archive and self.traffic_archive.mode == "record":
+            self.traffic_archive.record(archive_key, data)
+        return data
+    
+    async def _fetch(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Make a single request to the Zillow API"""
         headers = {
             "X-RapidAPI-Key": self.api_key,
             "X-RapidAPI-Host": "zillow-com1.p.rapidapi.com"
@@ -58,13 +125,19 @@ class ApartmentFinderAgent:
                     
                     # Better error messages for common issues
                     if "not subscribed" in error_text.lower():
-                        raise Exception("You are not subscribed to the Zillow API on RapidAPI. Please visit RapidAPI and subscribe to the Zillow API endpoint.")
+                        raise NonRetryableError("You are not subscribed to the Zillow API on RapidAPI. Please visit RapidAPI and subscribe to the Zillow API endpoint.")
                     elif "too many requests" in error_text.lower():
                         raise Exception("Rate limit exceeded. Your subscription plan may have limits on the number of requests.")
+                    elif 400 <= response.status < 500 and response.status != 429:
+                        raise NonRetryableError(f"API request failed with status {response.status}: {error_text}")
                     else:
                         raise Exception(f"API request failed with status {response.status}: {error_text}")
                 
-                data = await response.json()
+                body = await response.read()
+                if len(body) >= LARGE_RESPONSE_BYTES:
+                    data = await asyncio.to_thread(orjson.loads, body)
+                else:
+                    data = orjson.loads(body)
                 # Log a snippet of the response data structure for debugging
                 if isinstance(data, dict):
                     logger.info(f"API response keys: {data.keys()}")
@@ -76,8 +149,12 @@ class ApartmentFinderAgent:
                     logger.info(f"API response type: {type(data)}")
                 return data
     
-    async def search_apartments(self, criteria: SearchCriteria) -> List[Property]:
-        """Search for apartments based on the given criteria"""
+    async def search_apartments(self, criteria: SearchCriteria) -> List[PropertyRecord]:
+        """Search for apartments based on the given criteria
+        
+        Results are compact PropertyRecords, which templates can read directly;
+        call to_property() where a validated Property is needed.
+        """
         logger.info(f"Searching for apartments with criteria: {criteria}")
         
         # Convert criteria to API parameters for RapidAPI Zillow endpoint
@@ -87,10 +164,16 @@ class ApartmentFinderAgent:
             "page": "1"
         }
         
+        # The primary request and the fallback share one deadline so /search stays bounded
+        deadline = time.monotonic() + self.upstream_deadline
+        
         # Try with propertyExtendedSearch which is for property searches
         try:
             logger.info("Trying propertyExtendedSearch endpoint...")
-            response_data = await self._make_api_request("propertyExtendedSearch", params)
+            response_data = await self._make_api_request("propertyExtendedSearch", params, deadline)
+        except (CircuitOpenError, asyncio.TimeoutError):
+            # Upstream is unhealthy or slow; a second request would only fail the same way
+            raise
         except Exception as e:
             logger.warning(f"propertyExtendedSearch endpoint failed: {e}, trying alternative format...")
             # Try with alternative parameter format if needed
@@ -102,7 +185,7 @@ class ApartmentFinderAgent:
                 "minPrice": str(criteria.min_price),
                 "maxPrice": str(criteria.max_price)
             }
-            response_data = await self._make_api_request("propertyExtendedSearch", alt_params)
+            response_data = await self._make_api_request("propertyExtendedSearch", alt_params, deadline)
         
         # Debug log to see API response structure
         logger.info(f"API Response Keys: {response_data.keys() if isinstance(response_data, dict) else 'Not a dictionary'}")
@@ -111,6 +194,7 @@ class ApartmentFinderAgent:
         
         # Parse the results from RapidAPI Zillow format
         properties = []
+        observations = []
         
         if "props" in response_data and isinstance(response_data["props"], list):
             for item in response_data["props"]:
@@ -120,6 +204,17 @@ class ApartmentFinderAgent:
                     price_str = str(price_str) if price_str is not None else "0"
                     price = int(''.join(filter(str.isdigit, price_str))) if price_str else 0
                     
+                    # Record every observed price, including listings filtered out below
+                    address = item.get("address") or {}
+                    observations.append((
+                        str(item.get("zpid", "")),
+                        price,
+                        item.get("listingStatus"),
+                        address.get("city", ""),
+                        address.get("state", ""),
+                        address.get("zipcode", "")
+                    ))
+                    
                     # Debug log to see the actual price
                     logger.info(f"Property price: ${price}, min: ${criteria.min_price}, max: ${criteria.max_price}")
                     
@@ -152,8 +247,8 @@ class ApartmentFinderAgent:
                     sqft_str = str(sqft_str) if sqft_str is not None else ""
                     square_feet = int(''.join(filter(str.isdigit, sqft_str))) if sqft_str else None
                     
-                    # Create Property object
-                    prop = Property(
+                    # Create compact record; validation happens at the API boundary
+                    prop = PropertyRecord(
                         id=str(item.get("zpid", "")),
                         address=item.get("address", {}).get("streetAddress", ""),
                         city=item.get("address", {}).get("city", ""),
@@ -166,7 +261,7 @@ class ApartmentFinderAgent:
                         description=item.get("description", ""),
                         year_built=item.get("yearBuilt"),
                         url=f"https://www.zillow.com/homedetails/{item.get('zpid', '')}_zpid/",
-                        image_urls=[item.get("imgSrc", "")] if item.get("imgSrc") else [],
+                        image_urls=(item.get("imgSrc"),) if item.get("imgSrc") else (),
                         latitude=item.get("latitude"),
                         longitude=item.get("longitude"),
                         property_type=item.get("propertyType", "Apartment"),
@@ -177,8 +272,11 @@ class ApartmentFinderAgent:
                 except Exception as e:
                     logger.error(f"Error parsing property data: {e}")
         
-        # Store results for later use
-        self.last_search_results = properties
+        await asyncio.to_thread(self.price_history.record, observations)
+        
+        # Cache results for the details page
+        for prop in properties:
+            self._cache_property(prop)
         
         # Apply client-side filtering for pets and parking if needed
         if criteria.pets_allowed:
@@ -189,15 +287,43 @@ class ApartmentFinderAgent:
         
         logger.info(f"Found {len(properties)} matching properties")
         return properties
+    
+    def _cache_property(self, record: PropertyRecord):
+        """Add a listing to the LRU property cache"""
+        self.property_cache[record.id] = (time.monotonic(), record)
+        self.property_cache.move_to_end(record.id)
+        if len(self.property_cache) > PROPERTY_CACHE_SIZE:
+            self.property_cache.popitem(last=False)
+    
+    def _get_cached_property(self, property_id: str) -> Optional[Property]:
+        """Get a fresh, valid listing from the property cache"""
+        entry = self.property_cache.get(property_id)
+        if entry is None:
+            return None
+        
+        cached_at, record = entry
+        if time.monotonic() - cached_at > PROPERTY_CACHE_TTL:
+            del self.property_cache[property_id]
+            return None
+        
+        try:
+            prop = record.to_property()
+        except Exception as e:
+            logger.warning(f"Discarding invalid cached property {property_id}: {e}")
+            del self.property_cache[property_id]
+            return None
+        
+        self.property_cache.move_to_end(property_id)
+        return prop
         
     async def get_property_details(self, property_id: str) -> Property:
         """Get detailed information about a specific property"""
         logger.info(f"Getting details for property {property_id}")
         
-        # First check if we have this property in our last search results
-        for prop in self.last_search_results:
-            if prop.id == property_id:
-                return prop
+        # First check if we have this property in our cached results
+        cached = self._get_cached_property(property_id)
+        if cached is not None:
+            return cached
         
         # If not found in cache, fetch from API
         try:
@@ -223,6 +349,15 @@ class ApartmentFinderAgent:
             # Extract address components
             address = response_data.get("address", {})
             
+            await asyncio.to_thread(self.price_history.record, [(
+                property_id,
+                price,
+                response_data.get("homeStatus"),
+                address.get("city", ""),
+                address.get("state", ""),
+                address.get("zipcode", "")
+            )])
+            
             # Create Property object from the detailed data
             prop = Property(
                 id=property_id,
@@ -245,6 +380,7 @@ class ApartmentFinderAgent:
                 has_parking=self._extract_parking_info(response_data)
             )
             
+            self._cache_property(PropertyRecord.from_property(prop))
             return prop
             
         except Exception as e:
@@ -307,12 +443,11 @@ class ApartmentFinderAgent:
         # Add user message to conversation
         self.conversation.add_message("user", message)
         
-        if not self.openai_api_key:
+        replaying = self.traffic_archive is not None and self.traffic_archive.mode == "replay"
+        if not self.openai_api_key and not replaying:
             return "OpenAI API key is not set. Please set the OPENAI_API_KEY environment variable."
         
         try:
-            openai.api_key = self.openai_api_key
-            
             # Get the conversation history
             messages = self.conversation.get_history()
             
@@ -323,16 +458,27 @@ class ApartmentFinderAgent:
             }
             messages.insert(0, system_message)
             
-            # Get response from OpenAI
-            response = openai.ChatCompletion.create(
-                model="gpt-4-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+            request = {
+                "model": "gpt-4-turbo",
+                "messages": messages,
+                "temperature": 0.7,
+                "max_tokens": 500
+            }
+            archive_key = make_key("openai", request)
             
-            # Extract response content
-            assistant_response = response.choices[0].message.content
+            if replaying:
+                assistant_response = await self.traffic_archive.replay(archive_key)
+            else:
+                openai.api_key = self.openai_api_key
+                
+                # Get response from OpenAI
+                response = openai.ChatCompletion.create(**request)
+                
+                # Extract response content
+                assistant_response = response.choices[0].message.content
+                
+                if self.traffic_archive and self.traffic_archive.mode == "record":
+                    self.traffic_archive.record(archive_key, assistant_response)
             
             # Add assistant response to conversation
             self.conversation.add_message("assistant", assistant_response)
@@ -0,0 +1,342 @@
+"""
+Listing price history store for the ZillowAI apartment finder agent
+
+Every parsed search and detail response is fed through PriceHistoryStore,
+which keeps only changes in (price, status) per zpid. Changes are appended
+to a log of varint records, delta-encoded against the previous observation
+of the same listing, and mirrored in memory as per-listing arrays plus a
+per-location index of price drops ordered by time.
+"""
+
+import time
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .models import PricePoint, PriceDrop
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; the log is then safe for a single writer only
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Define history file path
+PRICE_HISTORY_FILE = Path("data") / "price_history.log"
+
+# Record tags
+_OBSERVATION = 0x01
+_LOCATION = 0x02
+_STATUS = 0x03
+
+_FIELD_SEPARATOR = "\x1f"
+
+def _write_varint(buf: bytearray, value: int):
+    """Append an unsigned LEB128 varint"""
+    while value > 0x7F:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """Read an unsigned LEB128 varint, returning (value, new offset)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+def _zigzag(value: int) -> int:
+    """Map a signed delta onto an unsigned integer"""
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+def _unzigzag(value: int) -> int:
+    """Inverse of _zigzag"""
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+def _location_keys(city: str, state: str, zipcode: str) -> List[str]:
+    """Index keys a listing is reachable under: "city, state" and zipcode"""
+    keys = []
+    if city:
+        keys.append(normalize_location(f"{city}, {state}" if state else city))
+    if zipcode:
+        keys.append(normalize_location(zipcode))
+    return keys
+
+def normalize_location(location: str) -> str:
+    """Normalize a location query to the form used by the drop index"""
+    return " ".join(location.replace(",", ", ").split()).lower()
+
+class _ListingHistory:
+    """Per-listing arrays of observed changes"""
+
+    __slots__ = ("times", "prices", "statuses", "location")
+
+    def __init__(self):
+        self.times = array("q")
+        self.prices = array("q")
+        self.statuses = array("H")
+        self.location: Tuple[str, str, str] = ("", "", "")
+
+class _DropIndex:
+    """Time-ordered price drops for one location"""
+
+    __slots__ = ("times", "events")
+
+    def __init__(self):
+        self.times = array("q")
+        self.events: List[Tuple[int, int, int]] = []  # (zpid, old_price, new_price)
+
+class PriceHistoryStore:
+    """Append-only, delta-encoded store of listing price changes
+
+    Several processes (e.g. uvicorn workers) may share one log. Appends are
+    made under an exclusive file lock, after first replaying any records
+    other processes wrote, so deltas are always encoded against the
+    latest observation in the file.
+
+    record(), history() and price_drops() may block on that lock and on
+    file I/O; call them from async code through asyncio.to_thread.
+    """
+
+    def __init__(self, path: Path = PRICE_HISTORY_FILE):
+        """Load the history log, creating it if necessary"""
+        self.path = Path(path)
+        self._listings: Dict[int, _ListingHistory] = {}
+        self._drops: Dict[str, _DropIndex] = {}
+        self._status_codes: Dict[str, int] = {}
+        self._status_names: List[Optional[str]] = [None]
+        self._last_time = 0
+        self._offset = 0
+        self._corrupt = False
+        self._thread_lock = threading.Lock()
+        self._load()
+
+    @contextmanager
+    def _locked(self):
+        """Open the log for appending under an exclusive lock"""
+        with self._thread_lock, open(self.path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        """Rebuild the in-memory state from the log"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._locked() as f:
+            count = self._catch_up(f)
+        logger.info(f"Loaded {count} price changes for {len(self._listings)} listings from {self.path}")
+
+    def _catch_up(self, f) -> int:
+        """Apply records appended since the last read; must hold the lock"""
+        if self._corrupt:
+            return 0
+        f.seek(self._offset)
+        data = f.read()
+        consumed, count, incomplete = self._decode(data)
+        if consumed < len(data):
+            if incomplete:
+                # Drop a partially written tail so later appends stay decodable
+                f.truncate(self._offset + consumed)
+            else:
+                # Keep the file intact for inspection; nothing after this point can be decoded
+                self._corrupt = True
+        self._offset += consumed
+        return count
+
+    def _refresh(self):
+        """Pick up records other processes appended since the last read"""
+        if not self._corrupt and self.path.stat().st_size != self._offset:
+            with self._locked() as f:
+                self._catch_up(f)
+
+    def _decode(self, data: bytes) -> Tuple[int, int, bool]:
+        """Apply encoded records
+
+        Returns (bytes consumed, observations applied, whether decoding
+        stopped at an incomplete record at the end of the data).
+        """
+        offset = 0
+        count = 0
+        while offset < len(data):
+            record_start = offset
+            try:
+                tag = data[offset]
+                offset += 1
+                if tag == _OBSERVATION:
+                    zpid, offset = _read_varint(data, offset)
+                    time_delta, offset = _read_varint(data, offset)
+                    price_delta, offset = _read_varint(data, offset)
+                    status, offset = _read_varint(data, offset)
+                    history = self._get_listing(zpid)
+                    timestamp = _unzigzag(time_delta) + (history.times[-1] if history.times else 0)
+                    price = _unzigzag(price_delta) + (history.prices[-1] if history.prices else 0)
+                    self._apply_observation(zpid, timestamp, price, status)
+                    count += 1
+                elif tag in (_LOCATION, _STATUS):
+                    ident, offset = _read_varint(data, offset)
+                    length, offset = _read_varint(data, offset)
+                    if offset + length > len(data):
+                        raise IndexError("truncated record")
+                    text = data[offset:offset + length].decode("utf-8")
+                    offset += length
+                    if tag == _LOCATION:
+                        self._get_listing(ident).location = tuple(text.split(_FIELD_SEPARATOR, 2))
+                    else:
+                        self._status_codes[text] = ident
+                        self._status_names.append(text)
+                else:
+                    raise ValueError(f"unknown record tag {tag}")
+            except IndexError as e:
+                logger.warning(f"Truncating price history at byte {self._offset + record_start}: {e}")
+                return record_start, count, True
+            except ValueError as e:
+                logger.error(
+                    f"Corrupt price history record at byte {self._offset + record_start}: {e}; "
+                    f"ignoring the rest of {self.path} and no longer recording"
+                )
+                return record_start, count, False
+        return offset, count, False
+
+    def _get_listing(self, zpid: int) -> _ListingHistory:
+        history = self._listings.get(zpid)
+        if history is None:
+            history = self._listings[zpid] = _ListingHistory()
+        return history
+
+    def _apply_observation(self, zpid: int, timestamp: int, price: int, status: int):
+        """Add a change to the per-listing arrays and the drop index"""
+        history = self._get_listing(zpid)
+        if history.prices and price < history.prices[-1]:
+            event = (zpid, history.prices[-1], price)
+            for key in _location_keys(*history.location):
+                index = self._drops.get(key)
+                if index is None:
+                    index = self._drops[key] = _DropIndex()
+                index.times.append(timestamp)
+                index.events.append(event)
+        history.times.append(timestamp)
+        history.prices.append(price)
+        history.statuses.append(status)
+        self._last_time = max(self._last_time, timestamp)
+
+    def _status_code(self, status: Optional[str], buf: bytearray) -> int:
+        """Look up or register the small integer code for a status string"""
+        if not status:
+            return 0
+        code = self._status_codes.get(status)
+        if code is None:
+            code = len(self._status_names)
+            self._status_codes[status] = code
+            self._status_names.append(status)
+            encoded = status.encode("utf-8")
+            buf.append(_STATUS)
+            _write_varint(buf, code)
+            _write_varint(buf, len(encoded))
+            buf.extend(encoded)
+        return code
+
+    def record(self, observations: List[Tuple[str, int, Optional[str], str, str, str]]):
+        """Record (zpid, price, status, city, state, zipcode) observations
+
+        Observations that do not change a listing's price or status are
+        discarded, so re-seeing the same listing costs nothing on disk.
+        """
+        with self._locked() as f:
+            self._catch_up(f)
+            if self._corrupt:
+                # Deltas appended past unreadable records could never be decoded
+                return
+
+            # Keep timestamps non-decreasing so the drop index stays sorted
+            now = max(int(time.time()), self._last_time)
+            buf = bytearray()
+
+            for property_id, price, status, city, state, zipcode in observations:
+                if not property_id or not str(property_id).isdigit() or price <= 0:
+                    continue
+                zpid = int(property_id)
+                history = self._get_listing(zpid)
+
+                location = (city or "", state or "", zipcode or "")
+                if location != history.location and any(location):
+                    history.location = location
+                    encoded = _FIELD_SEPARATOR.join(location).encode("utf-8")
+                    buf.append(_LOCATION)
+                    _write_varint(buf, zpid)
+                    _write_varint(buf, len(encoded))
+                    buf.extend(encoded)
+
+                code = self._status_code(status, buf)
+                if history.prices and history.prices[-1] == price and history.statuses[-1] == code:
+                    continue
+
+                previous_time = history.times[-1] if history.times else 0
+                previous_price = history.prices[-1] if history.prices else 0
+                buf.append(_OBSERVATION)
+                _write_varint(buf, zpid)
+                _write_varint(buf, _zigzag(now - previous_time))
+                _write_varint(buf, _zigzag(price - previous_price))
+                _write_varint(buf, code)
+                self._apply_observation(zpid, now, price, code)
+
+            if buf:
+                f.write(buf)
+                f.flush()
+                self._offset += len(buf)
+
+    def history(self, property_id: str) -> List[PricePoint]:
+        """Get the recorded price changes of a listing, oldest first"""
+        if not str(property_id).isdigit():
+            return []
+        self._refresh()
+        history = self._listings.get(int(property_id))
+        if history is None:
+            return []
+        return [
+            PricePoint(
+                timestamp=datetime.fromtimestamp(timestamp),
+                price=price,
+                status=self._status_names[status]
+            )
+            for timestamp, price, status in zip(history.times, history.prices, history.statuses)
+        ]
+
+    def price_drops(self, location: str, since: Optional[datetime] = None) -> List[PriceDrop]:
+        """Get price drops in a location ("City, ST" or zipcode) since a time"""
+        self._refresh()
+        index = self._drops.get(normalize_location(location))
+        if index is None:
+            return []
+
+        start = bisect_left(index.times, int(since.timestamp())) if since else 0
+        drops = []
+        for timestamp, (zpid, old_price, new_price) in zip(index.times[start:], index.events[start:]):
+            city, state, zipcode = self._listings[zpid].location
+            drops.append(PriceDrop(
+                property_id=str(zpid),
+                timestamp=datetime.fromtimestamp(timestamp),
+                old_price=old_price,
+                new_price=new_price,
+                city=city,
+                state=state,
+                zipcode=zipcode
+            ))
+        return drops
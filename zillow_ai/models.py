@@ -2,8 +2,9 @@
 Data models for the ZillowAI apartment finder agent
 """
 
+import sys
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 from uuid import uuid4
 
@@ -68,6 +69,101 @@ class Property(BaseModel):
     listing_date: Optional[datetime] = None
     property_type: Optional[str] = None
     tags: List[str] = []
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Intern a low-cardinality string so repeated values share one object"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class PropertyRecord:
+    """Compact, unvalidated property representation for large in-memory caches
+    
+    Holds the same fields as Property without Pydantic's per-instance dict and
+    validation cost. City, state, zipcode and property type are interned since
+    they repeat heavily across listings. Convert with to_property() only at the
+    API/template boundary.
+    """
+    
+    __slots__ = (
+        "id", "address", "city", "state", "zipcode", "price", "bedrooms",
+        "bathrooms", "square_feet", "description", "year_built", "url",
+        "image_urls", "pets_allowed", "has_parking", "latitude", "longitude",
+        "listing_date", "property_type", "tags",
+    )
+    
+    def __init__(
+        self,
+        id: str,
+        address: str,
+        city: str,
+        state: str,
+        zipcode: str,
+        price: int,
+        bedrooms: int,
+        bathrooms: float,
+        url: str,
+        square_feet: Optional[int] = None,
+        description: Optional[str] = None,
+        year_built: Optional[int] = None,
+        image_urls: Tuple[str, ...] = (),
+        pets_allowed: Optional[bool] = None,
+        has_parking: Optional[bool] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        listing_date: Optional[datetime] = None,
+        property_type: Optional[str] = None,
+        tags: Tuple[str, ...] = (),
+    ):
+        self.id = id
+        self.address = address
+        self.city = _intern(city)
+        self.state = _intern(state)
+        self.zipcode = _intern(zipcode)
+        self.price = price
+        self.bedrooms = bedrooms
+        self.bathrooms = bathrooms
+        self.square_feet = square_feet
+        self.description = description
+        self.year_built = year_built
+        self.url = url
+        self.image_urls = tuple(image_urls)
+        self.pets_allowed = pets_allowed
+        self.has_parking = has_parking
+        self.latitude = latitude
+        self.longitude = longitude
+        self.listing_date = listing_date
+        self.property_type = _intern(property_type)
+        self.tags = tuple(tags)
+    
+    @classmethod
+    def from_property(cls, prop: Property) -> "PropertyRecord":
+        """Build a compact record from a validated Property"""
+        return cls(**{name: getattr(prop, name) for name in cls.__slots__})
+    
+    def to_property(self) -> Property:
+        """Convert to a validated Property for the API/template boundary"""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["image_urls"] = list(self.image_urls)
+        data["tags"] = list(self.tags)
+        return Property(**data)
+    
+    def __repr__(self) -> str:
+        return f"PropertyRecord(id={self.id!r}, address={self.address!r}, price={self.price!r})"
+    
+class PricePoint(BaseModel):
+    """Model for a single observed price change of a listing"""
+    timestamp: datetime
+    price: int
+    status: Optional[str] = None
+
+class PriceDrop(BaseModel):
+    """Model for a price drop event from the price history change feed"""
+    property_id: str
+    timestamp: datetime
+    old_price: int
+    new_price: int
+    city: str
+    state: str
+    zipcode: str
     
 class SavedSearch(BaseModel):
     """Model for saved searches"""
@@ -0,0 +1,126 @@
+"""
+Record/replay archive for upstream Zillow and OpenAI traffic
+
+Responses are appended to a single archive file as frames of
+``sha256(key) | payload length | zlib(JSON payload)``. In replay mode the
+archive is memory-mapped and an in-memory index of key -> (offset, length)
+is built by walking the frame headers, so lookups never touch the network
+and only decompress the frame being served.
+"""
+
+import os
+import json
+import mmap
+import zlib
+import struct
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TRAFFIC_MODES = ("off", "record", "replay")
+DEFAULT_ARCHIVE_FILE = Path("data") / "traffic.archive"
+
+_FRAME_HEADER = struct.Struct("<32sI")
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when the archive has no response for a request"""
+
+def make_key(kind: str, payload: Dict[str, Any]) -> bytes:
+    """Build a stable archive key for a request"""
+    canonical = json.dumps([kind, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+class TrafficArchive:
+    """Append-only, indexed archive of upstream responses"""
+    
+    def __init__(self, path: Path, mode: str, latency_ms: float = 0.0):
+        """Open the archive for recording or replaying"""
+        if mode not in TRAFFIC_MODES:
+            raise ValueError(f"Unknown traffic mode '{mode}', expected one of {TRAFFIC_MODES}")
+        
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = max(latency_ms, 0.0) / 1000.0
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._mmap: Optional[mmap.mmap] = None
+        self._file = None
+        
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Unbuffered so each frame reaches the file as a single O_APPEND write
+            self._file = open(self.path, "ab", buffering=0)
+            logger.info(f"Recording upstream traffic to {self.path}")
+        elif mode == "replay":
+            self._open_for_replay()
+    
+    def _open_for_replay(self):
+        """Memory-map the archive and index its frames"""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            logger.warning(f"Traffic archive {self.path} is missing or empty; every request will miss")
+            return
+        
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        offset = 0
+        size = len(self._mmap)
+        while offset + _FRAME_HEADER.size <= size:
+            digest, length = _FRAME_HEADER.unpack_from(self._mmap, offset)
+            start = offset + _FRAME_HEADER.size
+            if start + length > size:
+                logger.warning(f"Ignoring truncated frame at offset {offset} in {self.path}")
+                break
+            # Later frames win so re-recorded requests replace stale ones
+            self._index[digest] = (start, length)
+            offset = start + length
+        
+        logger.info(f"Replaying {len(self._index)} recorded responses from {self.path}")
+    
+    def record(self, key: bytes, data: Any):
+        """Append a response to the archive"""
+        payload = zlib.compress(json.dumps(data, default=str).encode("utf-8"))
+        # One write per frame so concurrent appenders cannot interleave header and payload
+        frame = _FRAME_HEADER.pack(key, len(payload)) + payload
+        with self._lock:
+            written = self._file.write(frame)
+        if written != len(frame):
+            raise OSError(f"Short write to traffic archive {self.path}: {written} of {len(frame)} bytes")
+    
+    async def replay(self, key: bytes) -> Any:
+        """Serve a recorded response, applying the simulated latency"""
+        location = self._index.get(key)
+        if location is None:
+            raise ReplayMiss("No recorded response for this request in the traffic archive")
+        
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        start, length = location
+        return json.loads(zlib.decompress(self._mmap[start:start + length]))
+    
+    def close(self):
+        """Release the memory map and file handle"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def archive_from_env() -> Optional[TrafficArchive]:
+    """Create the archive configured by TRAFFIC_MODE, or None when disabled"""
+    mode = os.getenv("TRAFFIC_MODE", "off").strip().lower()
+    if mode == "off":
+        return None
+    
+    path = Path(os.getenv("TRAFFIC_ARCHIVE", str(DEFAULT_ARCHIVE_FILE)))
+    latency_ms = float(os.getenv("TRAFFIC_REPLAY_LATENCY_MS", "0"))
+    return TrafficArchive(path, mode, latency_ms)
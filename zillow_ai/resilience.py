@@ -0,0 +1,247 @@
+"""
+Latency-aware resilience for upstream API calls
+
+ResilientCaller runs each call with a per-attempt timeout, hedges a
+duplicate attempt once the call outlives the observed p95 latency, and
+retries failures. Hedges and retries draw from a shared RetryBudget, so an
+outage cannot multiply upstream load, and a CircuitBreaker fails calls fast
+while the upstream is unhealthy.
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open"""
+
+class NonRetryableError(Exception):
+    """Raised by an attempt whose failure will not change on retry (e.g. a 4xx response)"""
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20, default: float = 1.0):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.default = default
+
+    def observe(self, seconds: float):
+        """Record the latency of a successful attempt"""
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        """Latency at quantile q, or the default until enough samples exist"""
+        if len(self.samples) < self.min_samples:
+            return self.default
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half-open"""
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def probing(self) -> bool:
+        """Whether a half-open probe call is in flight"""
+        return self._probing
+
+    def allow(self) -> bool:
+        """Whether a new attempt may be sent upstream"""
+        if self._opened_at is None:
+            return True
+        if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        """Close the circuit after a successful attempt"""
+        if self._opened_at is not None:
+            logger.info("Circuit breaker closed")
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def release_probe(self):
+        """Give up an unfinished probe so a later call can probe again"""
+        self._probing = False
+
+    def record_failure(self):
+        """Count a failed attempt, opening the circuit past the threshold"""
+        self._failures += 1
+        if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+            logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures")
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+class RetryBudget:
+    """Token bucket limiting retries and hedges to a fraction of calls"""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def deposit(self):
+        """Credit the budget for a new call"""
+        self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        """Spend one token on an extra attempt, if available"""
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+class ResilientCaller:
+    """Runs upstream calls with timeouts, hedging, retries and a circuit breaker"""
+
+    def __init__(
+        self,
+        attempt_timeout: float = 5.0,
+        max_attempts: int = 3,
+        hedge_quantile: float = 0.95,
+        min_hedge_delay: float = 0.05,
+        retry_backoff: float = 0.2,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.latencies: Dict[str, LatencyTracker] = {}
+
+    def hedge_delay(self, name: str) -> float:
+        """Delay before hedging a call, based on its observed latency"""
+        tracker = self.latencies.setdefault(name, LatencyTracker())
+        delay = max(tracker.percentile(self.hedge_quantile), self.min_hedge_delay)
+        return min(delay, self.attempt_timeout)
+
+    async def _attempt(self, name: str, factory: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        """Run one attempt under its timeout, tracking its latency"""
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(factory(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"{name} attempt timed out after {timeout:.2f}s")
+        self.latencies.setdefault(name, LatencyTracker()).observe(time.monotonic() - start)
+        return result
+
+    async def call(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable[Any]],
+        deadline: Optional[float] = None
+    ) -> Any:
+        """Call factory() until one attempt succeeds or the attempts are exhausted
+
+        deadline is an optional time.monotonic() value bounding the whole
+        call, including hedges and retries; asyncio.TimeoutError is raised
+        once it passes.
+        """
+        def remaining() -> Optional[float]:
+            return None if deadline is None else deadline - time.monotonic()
+
+        left = remaining()
+        if left is not None and left <= 0:
+            raise asyncio.TimeoutError(f"{name} deadline passed before calling upstream")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Upstream circuit is open; not calling {name}")
+        probe = self.breaker.probing
+        self.budget.deposit()
+
+        pending = set()
+        attempts = 0
+        can_hedge = True
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            nonlocal attempts
+            attempts += 1
+            left = remaining()
+            timeout = self.attempt_timeout if left is None else min(self.attempt_timeout, left)
+            pending.add(asyncio.ensure_future(self._attempt(name, factory, timeout)))
+
+        launch()
+        try:
+            while pending:
+                hedge_after = self.hedge_delay(name) if can_hedge and attempts < self.max_attempts else None
+                left = remaining()
+                if left is not None and left <= 0:
+                    # Still-running attempts are as good as failed for this caller
+                    self.breaker.record_failure()
+                    raise asyncio.TimeoutError(f"{name} exceeded its deadline") from last_error
+                timeout = hedge_after
+                if left is not None and (timeout is None or left < timeout):
+                    timeout = left
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if hedge_after is not None and timeout == hedge_after:
+                        # The call is slower than usual; hedge once with a duplicate attempt
+                        if self.budget.withdraw():
+                            logger.info(f"Hedging slow {name} call (attempt {attempts + 1})")
+                            launch()
+                        can_hedge = False
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        result = task.result()
+                    except NonRetryableError:
+                        # The upstream answered, so it counts as healthy
+                        self.breaker.record_success()
+                        raise
+                    except Exception as e:
+                        logger.warning(f"{name} attempt failed: {e}")
+                        last_error = e
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                        return result
+
+                if not pending and attempts < self.max_attempts:
+                    if not self.breaker.allow():
+                        raise CircuitOpenError(f"Upstream circuit opened while calling {name}") from last_error
+                    left = remaining()
+                    if left is not None and left <= self.retry_backoff:
+                        break
+                    if not self.budget.withdraw():
+                        logger.warning(f"Retry budget exhausted; not retrying {name}")
+                        break
+                    await asyncio.sleep(self.retry_backoff)
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if probe and self.breaker.probing:
+                # The probe was cancelled or abandoned before an outcome was recorded
+                self.breaker.release_probe()